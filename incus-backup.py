@@ -2,10 +2,23 @@
 import subprocess
 import json
 import os
+import re
+import shlex
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import http.client
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
 from datetime import datetime, timedelta
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
 
 # ==========================
 # Configuration Variables
@@ -16,8 +29,30 @@ BACKUP_DIR = "/mnt/ice/incus-vms/"         # Directory for exported backups
 LOG_FILE = "/var/log/incus-backup-nickf.log" # Log file path
 STORAGE_POOL = "default"                   # Name of the Incus storage pool
 PROJECT = "default"                        # Incus project name
+MAX_PARALLEL_EXPORTS = 4                   # Max exports run concurrently
+INCUS_SOCKET = "/var/lib/incus/unix.socket" # Incus daemon API socket
+ZSTD_LEVEL = 3                             # zstd starting compression level (used when zstd is installed)
+ZSTD_MAX_LEVEL = 19                        # Highest level zstd --adapt may raise to while I/O is the bottleneck
+PREALLOCATE_BACKUPS = False                # Preallocate streamed backups from the previous run's size
+SIZE_HINTS_FILE = ".incus-backup-sizes.json" # Per-backup sizes from the last run, kept in BACKUP_DIR
+LOG_FLUSH_INTERVAL = 30                    # Seconds between flushes of buffered log file records
 # ==========================
 
+# Resolve executables once. An absolute path (plus close_fds=False below) lets
+# subprocess use posix_spawn instead of fork/exec for each command.
+INCUS = shutil.which("incus") or "incus"
+
+# Compress with multi-threaded zstd when available, then pigz, otherwise let incus gzip the export.
+ZSTD = shutil.which("zstd")
+PIGZ = shutil.which("pigz")
+BACKUP_EXT = ".tar.zst" if ZSTD else ".tar.gz"
+# Compressor thread budget for a whole run; one core is left free for incus itself.
+# main() splits it across the parallel exports.
+_COMPRESS_THREADS = max(1, (os.cpu_count() or 1) - 1)
+
+# Matches the trailing "-YYYYmmddHHMMSS.tar.gz" / ".tar.zst" stamp on backup filenames.
+_TS_RE = re.compile(r"-(\d{14})\.tar\.(?:gz|zst)$")
+
 # Set up logging
 logger = logging.getLogger("incus_backup")
 logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
@@ -31,94 +66,248 @@ console_handler.setFormatter(formatter)
 console_handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
 logger.addHandler(console_handler)
 
-# File handler with rotation (max 5 MB per file, 3 backup files)
-try:
-    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.DEBUG)
-    logger.addHandler(file_handler)
-except Exception as e:
-    logger.error(f"Error setting up file handler for log file {LOG_FILE}: {e}")
+# Block-buffer the log file so a batch of records costs one write, not one per line.
+_LOG_BUFFER_SIZE = 64 * 1024
+
+class SizeCachingRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that tracks the log size itself. The stock
+    shouldRollover() seeks and stats the file on every record; this counts
+    the encoded bytes of each record and only checks the file once the
+    cached size reaches maxBytes.
+    The file is block-buffered and is not flushed after every record;
+    explicit flush() calls (see BatchFlushingMemoryHandler) write it out.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        self._in_emit = False
+        super().__init__(filename, *args, **kwargs)
+        try:
+            self._size = os.path.getsize(self.baseFilename)
+        except OSError:
+            self._size = 0
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=_LOG_BUFFER_SIZE,
+                    encoding=self.encoding, errors=getattr(self, "errors", None))
+
+    def emit(self, record):
+        # StreamHandler.emit() flushes after each record; skip that so writes batch in the buffer.
+        self._in_emit = True
+        try:
+            super().emit(record)
+        finally:
+            self._in_emit = False
+
+    def flush(self):
+        if not self._in_emit:
+            super().flush()
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:  # delay was set
+            self.stream = self._open()
+        msg = "%s\n" % self.format(record)
+        msg_len = len(msg.encode(self.stream.encoding, self.stream.errors))
+        self._size += msg_len
+        if self._size < self.maxBytes:
+            return False
+        # Never roll over special files such as /dev/null, as the stock handler does.
+        if os.path.exists(self.baseFilename) and not os.path.isfile(self.baseFilename):
+            return False
+        # This record will be the first one in the fresh file.
+        self._size = msg_len
+        return True
+
+class BatchFlushingMemoryHandler(MemoryHandler):
+    """MemoryHandler that also flushes its target's stream once per batch written."""
+
+    def flush(self):
+        with self.lock:
+            super().flush()
+            if self.target:
+                self.target.flush()
+
+def start_log_flusher(handler, interval):
+    """Flushes a buffering handler every interval seconds from a daemon thread."""
+    def flush_periodically():
+        while True:
+            time.sleep(interval)
+            handler.flush()
+
+    threading.Thread(target=flush_periodically, name="log-flusher", daemon=True).start()
+
+def setup_file_handler(path):
+    """
+    Attaches a rotating file handler (max 5 MB per file, 3 backup files) to the logger.
+    Its level follows DEBUG so filtered records are dropped before formatting.
+    Records are buffered in a MemoryHandler and written out in batches: when
+    1024 are pending, on any ERROR, every LOG_FLUSH_INTERVAL seconds, and at exit.
+    Returns the buffering handler attached to the logger, or None on failure.
+    """
+    try:
+        file_handler = SizeCachingRotatingFileHandler(path, maxBytes=5*1024*1024, backupCount=3)
+        file_handler.setFormatter(formatter)
+        file_handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+        memory_handler = BatchFlushingMemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=file_handler)
+        memory_handler.setLevel(file_handler.level)
+        logger.addHandler(memory_handler)
+        start_log_flusher(memory_handler, LOG_FLUSH_INTERVAL)
+        return memory_handler
+    except Exception as e:
+        logger.error(f"Error setting up file handler for log file {path}: {e}")
+        return None
+
+file_log_handler = setup_file_handler(LOG_FILE)
 
 def check_backup_dir(path):
     """Check if the backup directory exists; if not, try to create it."""
     if not os.path.isdir(path):
-        logger.debug(f"Backup directory '{path}' does not exist. Attempting to create it.")
+        logger.debug("Backup directory '%s' does not exist. Attempting to create it.", path)
         try:
             os.makedirs(path, exist_ok=True)
-            logger.debug(f"Successfully created backup directory '{path}'.")
+            logger.debug("Successfully created backup directory '%s'.", path)
         except Exception as e:
             raise RuntimeError(f"Failed to create backup directory '{path}': {e}")
 
+class _CommandStr:
+    """Renders a command list with shlex.join() only if a log record actually formats it."""
+    __slots__ = ("command",)
+
+    def __init__(self, command):
+        self.command = command
+
+    def __str__(self):
+        return shlex.join(self.command)
+
 def run_command(command, description="", capture=True):
     """
     Run a subprocess command.
     If capture is True, it captures stdout and stderr.
+    If capture is False, stdout is discarded and only stderr is kept for error reporting.
     Logs debug output and errors.
     """
-    logger.debug(f"Running command: {' '.join(command)} {description}")
+    logger.debug("Running command: %s %s", _CommandStr(command), description)
     try:
-        result = subprocess.run(command, capture_output=capture, text=True, check=True)
-        logger.debug(f"Command output: {result.stdout.strip()}")
+        # Our own fds are non-inheritable (PEP 446), so close_fds=False is safe and enables posix_spawn.
+        if capture:
+            result = subprocess.run(command, capture_output=True, text=True, check=True, close_fds=False)
+        else:
+            result = subprocess.run(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True, close_fds=False
+            )
+        if result.stdout and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Command output: %s", result.stdout.strip())
         return result
     except subprocess.CalledProcessError as e:
-        err_msg = f"Error during command '{' '.join(command)}': {e.stderr.strip() if e.stderr else e}"
+        err_msg = f"Error during command {shlex.join(command)!r}: {e.stderr.strip() if e.stderr else e}"
         logger.error(err_msg)
         raise RuntimeError(err_msg)
 
-def get_vm_names():
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a Unix domain socket instead of TCP."""
+
+    def __init__(self, socket_path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+class IncusClient:
+    """
+    Minimal client for the Incus REST API on the local Unix socket.
+    Keeps one connection alive so repeated queries avoid forking the CLI.
+    """
+
+    def __init__(self, socket_path=INCUS_SOCKET):
+        self.conn = UnixHTTPConnection(socket_path)
+
+    def get(self, path):
+        """Performs a GET request and returns the response metadata."""
+        logger.debug("Incus API request: GET %s", path)
+        try:
+            self.conn.request("GET", path)
+            response = self.conn.getresponse()
+            data = json.loads(response.read())
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.conn.close()
+            raise RuntimeError(f"Incus API request GET {path} failed: {e}")
+
+        if response.status >= 400 or data.get("type") == "error":
+            raise RuntimeError(f"Incus API request GET {path} failed: {data.get('error') or response.reason}")
+        return data.get("metadata")
+
+    def close(self):
+        self.conn.close()
+
+def incus_query(client, path, command, description=""):
+    """
+    Fetches a JSON listing through the Incus API if a client is available,
+    falling back to running the equivalent incus CLI command.
+    """
+    if client is not None:
+        try:
+            return client.get(path)
+        except RuntimeError as e:
+            logger.debug("%s; falling back to incus CLI", e)
+    result = run_command(command, description=description)
+    return json.loads(result.stdout)
+
+def get_vm_names(project="default", client=None):
     """
-    Runs 'incus list' and parses the output to extract unique VM names.
-    Assumes the output is a table where the first column is NAME.
+    Lists instances in the project (via the API or 'incus list' JSON output) and extracts their names.
     """
     try:
-        result = run_command(["incus", "list"], description="listing VMs")
-    except RuntimeError as e:
-        logger.error(f"Error running 'incus list': {e}")
+        instances = incus_query(
+            client, f"/1.0/instances?recursion=1&project={quote(project, safe='')}",
+            [INCUS, "list", "--project", project, "--format", "json"], description="listing VMs"
+        )
+    except (RuntimeError, ValueError) as e:
+        logger.error("Error listing instances: %s", e)
         return []
 
-    vm_names = set()
-    for line in result.stdout.splitlines():
-        logger.debug(f"Processing line: {line}")
-        if line.startswith("|"):
-            parts = [part.strip() for part in line.strip().split("|")]
-            if len(parts) > 1 and parts[1] != "NAME" and parts[1]:
-                logger.debug(f"Found VM name: {parts[1]}")
-                vm_names.add(parts[1])
-    vm_list = list(vm_names)
-    logger.debug(f"Total VMs found: {vm_list}")
+    # Instance names are unique within a project, so no de-duplication is needed.
+    vm_list = [inst["name"] for inst in instances if inst.get("name")]
+    logger.debug("Total VMs found: %s", vm_list)
     return vm_list
 
-def get_vm_block_volumes(storage_pool, project="default"):
+def get_vm_block_volumes(storage_pool, project="default", client=None):
     """Returns a dictionary mapping VM names to their custom block volumes in the specified project."""
     try:
-        result = run_command(
-            ["incus", "storage", "volume", "list", storage_pool, "--all-projects", "--format", "json"],
+        volumes = incus_query(
+            client, f"/1.0/storage-pools/{quote(storage_pool, safe='')}/volumes?recursion=1&all-projects=true",
+            [INCUS, "storage", "volume", "list", storage_pool, "--all-projects", "--format", "json"],
             description=f"listing storage volumes in pool {storage_pool}"
         )
-        volumes = json.loads(result.stdout)
     except Exception as e:
         logger.error(f"Failed to get storage volumes: {e}")
         return defaultdict(list)
 
+    prefix = "/1.0/instances/"
     vm_volumes = defaultdict(list)
     for vol in volumes:
-        if (
+        if not (
             vol.get("project") == project
             and vol.get("type") == "custom"
             and vol.get("content_type") == "block"
         ):
-            for used_by in vol.get("used_by", []):
-                if used_by.startswith("/1.0/instances/"):
-                    vm_name = used_by.split("/")[-1]
-                    vm_volumes[vm_name].append(vol["name"])
+            continue
+        name = vol["name"]
+        for used_by in vol.get("used_by", ()):
+            if used_by.startswith(prefix):
+                # Outside the default project the URL carries a "?project=..." suffix.
+                vm_volumes[used_by.rsplit("/", 1)[1].split("?", 1)[0]].append(name)
     return vm_volumes
 
-def format_duration(duration: timedelta) -> str:
+def format_duration(total_seconds: float) -> str:
     """
-    Format a timedelta into a human-readable string: seconds, minutes, or hours.
+    Format a duration in seconds into a human-readable string: seconds, minutes, or hours.
     """
-    total_seconds = duration.total_seconds()
     if total_seconds < 60:
         return f"{total_seconds:.2f} seconds"
     elif total_seconds < 3600:
@@ -129,139 +318,374 @@ def format_duration(duration: timedelta) -> str:
         return f"{hours:.2f} hours"
 
 
-def export_vm(vm_name: str, backup_path: str) -> None:
+def _speed(size_mb: float, seconds: float) -> float:
+    """Returns throughput in MB/s, or infinity if no measurable time elapsed."""
+    return size_mb / seconds if seconds > 0 else float('inf')
+
+
+def preallocate(fd: int, size: int) -> bool:
+    """
+    Reserves size bytes for fd so the filesystem can lay the file out in
+    contiguous extents. Returns False if preallocation is not possible.
+    """
+    if not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+    except OSError as e:
+        logger.debug("Skipping preallocation of %d bytes: %s", size, e)
+        return False
+
+
+def get_compress_command(backup_path: str, threads: int = _COMPRESS_THREADS) -> Optional[list]:
+    """
+    Returns the parallel compressor to stream an export through: zstd for
+    .tar.zst backups, pigz for .tar.gz when installed, using the given
+    number of threads. Returns None when incus should compress the export itself.
+    """
+    if backup_path.endswith(".zst"):
+        max_level = max(ZSTD_LEVEL, ZSTD_MAX_LEVEL)
+        logger.info("Compressing %s with zstd level %d (adaptive up to %d) on %d threads",
+                    backup_path, ZSTD_LEVEL, max_level, threads)
+        # --adapt starts at ZSTD_LEVEL, raises it while the export or the disk is the
+        # bottleneck and lowers it again when compression can't keep up.
+        return [ZSTD, f"-T{threads}", f"-{ZSTD_LEVEL}", f"--adapt=min=1,max={max_level}", "-q", "-c"]
+    if PIGZ:
+        logger.info("Compressing %s with pigz on %d threads", backup_path, threads)
+        return [PIGZ, "-p", str(threads), "-c"]
+    return None
+
+
+def _remove_partial_backup(backup_path: str):
+    try:
+        os.unlink(backup_path)
+    except FileNotFoundError:
+        pass
+
+
+def run_compressed_export(export_command, compress_command, backup_path, description="", size_hint=None):
+    """
+    Runs an incus export that writes to stdout and pipes it straight into
+    compress_command, so compression overlaps the export and no
+    uncompressed copy is written to the backup filesystem.
+    If PREALLOCATE_BACKUPS is set and a size hint is known, the output
+    file is preallocated and trimmed to the real size afterwards.
+    """
+    logger.debug(
+        "Running pipeline: %s | %s > %s %s",
+        _CommandStr(export_command), _CommandStr(compress_command), backup_path, description
+    )
+    fd = os.open(backup_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    export_proc = compress_proc = None
+    try:
+        preallocated = bool(PREALLOCATE_BACKUPS and size_hint) and preallocate(fd, size_hint)
+
+        # The export's stderr goes to a temp file so it can never fill a pipe and stall the stream.
+        with tempfile.TemporaryFile() as export_err:
+            export_proc = subprocess.Popen(
+                export_command, stdout=subprocess.PIPE, stderr=export_err, close_fds=False
+            )
+            compress_proc = subprocess.Popen(
+                compress_command, stdin=export_proc.stdout, stdout=fd, stderr=subprocess.PIPE, close_fds=False
+            )
+            # Drop our copy of the pipe so the export sees EPIPE if the compressor dies.
+            export_proc.stdout.close()
+            _, compress_stderr = compress_proc.communicate()
+            export_proc.wait()
+
+            # A dead compressor also breaks the export's pipe, so report it first.
+            failed = None
+            if compress_proc.returncode != 0:
+                failed = (compress_command, compress_proc.returncode, compress_stderr)
+            elif export_proc.returncode != 0:
+                export_err.seek(0)
+                failed = (export_command, export_proc.returncode, export_err.read())
+
+        if preallocated and not failed:
+            # The compressor shared our file offset, so it marks the end of the real data.
+            os.ftruncate(fd, os.lseek(fd, 0, os.SEEK_CUR))
+    except BaseException:
+        # A failed spawn or an interrupt (e.g. Ctrl-C) must not leave children or a partial file behind.
+        for proc in (export_proc, compress_proc):
+            if proc is not None:
+                if proc.poll() is None:
+                    proc.kill()
+                proc.wait()
+        if export_proc is not None:
+            export_proc.stdout.close()
+        _remove_partial_backup(backup_path)
+        raise
+    finally:
+        os.close(fd)
+
+    if failed:
+        command, returncode, stderr = failed
+        detail = stderr.decode(errors="replace").strip() or f"exit status {returncode}"
+        err_msg = f"Error during command {shlex.join(command)!r}: {detail}"
+        _remove_partial_backup(backup_path)
+        logger.error(err_msg)
+        raise RuntimeError(err_msg)
+
+
+def export_vm(vm_name: str, backup_path: str, project: str = None, size_hint: Optional[int] = None,
+              compress_threads: int = _COMPRESS_THREADS) -> Optional[int]:
     """
     Exports the VM to a file using the incus export command and calculates metrics.
+    Returns the size of the backup file in bytes, or None if it is missing.
     """
-    logger.info(f"Exporting VM '{vm_name}' to file '{backup_path}'")
+    logger.info("Exporting VM '%s' to file '%s'", vm_name, backup_path)
     try:
-        start_time = datetime.now()
-        run_command(
-            ["incus", "export", vm_name, backup_path, "--optimized-storage", "--instance-only"],
-            description=f"exporting VM {vm_name} to {backup_path}"
-        )
-        end_time = datetime.now()
-        duration = end_time - start_time
-
-        if os.path.exists(backup_path):
-            size_bytes = os.path.getsize(backup_path)
-            size_mb = size_bytes / (1024 * 1024)
-            duration_str = format_duration(duration)
-            speed = size_mb / duration.total_seconds() if duration.total_seconds() > 0 else float('inf')
-
-            logger.info(
-                f"Backup of {vm_name} completed in {duration_str}. "
-                f"Size: {size_mb:.2f} MB. Speed: {speed:.2f} MB/s"
+        start_ns = time.monotonic_ns()
+        compress_command = get_compress_command(backup_path, compress_threads)
+        project_args = ["--project", project] if project else []
+        if compress_command:
+            run_compressed_export(
+                [INCUS, "export", vm_name, "-", "--optimized-storage", "--instance-only",
+                 "--compression=none", *project_args],
+                compress_command,
+                backup_path,
+                description=f"exporting VM {vm_name} to {backup_path}",
+                size_hint=size_hint
             )
         else:
+            run_command(
+                [INCUS, "export", vm_name, backup_path, "--optimized-storage", "--instance-only", *project_args],
+                description=f"exporting VM {vm_name} to {backup_path}",
+                capture=False
+            )
+        duration_sec = (time.monotonic_ns() - start_ns) / 1e9
+
+        try:
+            size_bytes = os.stat(backup_path).st_size
+        except FileNotFoundError:
             logger.error(f"Backup file {backup_path} not found after export")
+            return None
+
+        size_mb = size_bytes / (1024 * 1024)
+        logger.info(
+            "Backup of %s completed in %s. Size: %.2f MB. Speed: %.2f MB/s",
+            vm_name, format_duration(duration_sec), size_mb, _speed(size_mb, duration_sec)
+        )
+        return size_bytes
     except Exception as e:
         logger.error(f"Error exporting VM {vm_name}: {e}")
         raise
 
 
-def export_block_volume(storage_pool: str, volume_name: str, backup_path: str, project: str = None) -> None:
+def export_block_volume(storage_pool: str, volume_name: str, backup_path: str, project: str = None,
+                        size_hint: Optional[int] = None, compress_threads: int = _COMPRESS_THREADS) -> Optional[int]:
     """
     Exports a block storage volume to a file using incus storage volume export.
+    Returns the size of the backup file in bytes, or None if it is missing.
     """
-    logger.info(f"Exporting block volume '{volume_name}' to '{backup_path}'")
+    logger.info("Exporting block volume '%s' to '%s'", volume_name, backup_path)
     try:
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
+        compress_command = get_compress_command(backup_path, compress_threads)
         cmd = [
-            "incus", "storage", "volume", "export",
+            INCUS, "storage", "volume", "export",
             storage_pool,
             volume_name,
-            backup_path,
-            "--optimized-storage"
+            "-" if compress_command else backup_path,
+            "--optimized-storage",
+            "--volume-only"
         ]
+        if compress_command:
+            cmd.append("--compression=none")
         if project:
             cmd.extend(["--project", project])
-        run_command(cmd, description=f"exporting block volume {volume_name}")
-        end_time = datetime.now()
-        duration = end_time - start_time
-
-        if os.path.exists(backup_path):
-            size_bytes = os.path.getsize(backup_path)
-            size_mb = size_bytes / (1024 * 1024)
-            duration_str = format_duration(duration)
-            speed = size_mb / duration.total_seconds() if duration.total_seconds() > 0 else float('inf')
-
-            logger.info(
-                f"Block volume {volume_name} exported in {duration_str}. "
-                f"Size: {size_mb:.2f} MB. Speed: {speed:.2f} MB/s"
+        if compress_command:
+            run_compressed_export(
+                cmd, compress_command, backup_path,
+                description=f"exporting block volume {volume_name}", size_hint=size_hint
             )
         else:
+            run_command(cmd, description=f"exporting block volume {volume_name}", capture=False)
+        duration_sec = (time.monotonic_ns() - start_ns) / 1e9
+
+        try:
+            size_bytes = os.stat(backup_path).st_size
+        except FileNotFoundError:
             logger.error(f"Block volume backup {backup_path} not found after export")
+            return None
+
+        size_mb = size_bytes / (1024 * 1024)
+        logger.info(
+            "Block volume %s exported in %s. Size: %.2f MB. Speed: %.2f MB/s",
+            volume_name, format_duration(duration_sec), size_mb, _speed(size_mb, duration_sec)
+        )
+        return size_bytes
     except Exception as e:
         logger.error(f"Error exporting block volume {volume_name}: {e}")
         raise
 
-def prune_old_backups():
-    """Removes backup files older than BACKUP_RETENTION_DAYS days"""
+@lru_cache(maxsize=4096)
+def parse_backup_timestamp(ts: str) -> datetime:
+    """
+    Parses a YYYYmmddHHMMSS backup stamp. Cached because every backup file
+    written by one run shares the same stamp.
+    """
+    return datetime(
+        int(ts[0:4]), int(ts[4:6]), int(ts[6:8]),
+        int(ts[8:10]), int(ts[10:12]), int(ts[12:14])
+    )
+
+def prune_old_backups(cutoff=None):
+    """Removes backup files stamped before cutoff (default: BACKUP_RETENTION_DAYS days ago)"""
     logger.info(f"Pruning backups older than {BACKUP_RETENTION_DAYS} days")
     
-    cutoff = datetime.now() - timedelta(days=BACKUP_RETENTION_DAYS)
+    if cutoff is None:
+        cutoff = datetime.now() - timedelta(days=BACKUP_RETENTION_DAYS)
     deleted_count = 0
     error_count = 0
 
     try:
-        for filename in os.listdir(BACKUP_DIR):
-            if not filename.endswith(".tar.gz"):
-                continue
-                
-            try:
-                timestamp_str = filename.split("-")[-1].split(".")[0]
-                file_date = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                file_path = os.path.join(BACKUP_DIR, filename)
-                
-                if file_date < cutoff:
-                    logger.debug(f"Deleting old backup: {filename}")
-                    os.remove(file_path)
-                    deleted_count += 1
+        with os.scandir(BACKUP_DIR) as entries:
+            for entry in entries:
+                filename = entry.name
+                match = _TS_RE.search(filename)
+                if not match:
+                    continue
+                    
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+
+                    file_date = parse_backup_timestamp(match.group(1))
                     
-            except ValueError as e:
-                error_count += 1
-                logger.error(f"Invalid timestamp in filename {filename}: {e}")
-            except Exception as e:
-                error_count += 1
-                logger.error(f"Error deleting {filename}: {e}")
+                    if file_date < cutoff:
+                        if DEBUG:
+                            logger.debug("Deleting old backup: %s", filename)
+                        os.unlink(entry.path)
+                        deleted_count += 1
+                        
+                except ValueError as e:
+                    error_count += 1
+                    logger.error(f"Invalid timestamp in filename {filename}: {e}")
+                except Exception as e:
+                    error_count += 1
+                    logger.error(f"Error deleting {filename}: {e}")
 
         logger.info(f"Backup pruning complete. Deleted {deleted_count} files, {error_count} errors")
 
     except Exception as e:
         logger.error(f"Failed to prune backups: {e}")
 
+def load_size_hints(path):
+    """Loads the per-backup sizes recorded by the previous run, if any."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error("Ignoring unreadable size hints file %s: %s", path, e)
+        return {}
+
+def save_size_hints(path, size_hints):
+    """Writes the per-backup sizes for the next run, replacing the file atomically."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(size_hints, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error("Failed to save size hints file %s: %s", path, e)
+
+def plan_exports(vm_names, vm_block_volumes, timestamp, size_hints):
+    """
+    Builds the export jobs for this run as (vm, name, function, args) tuples:
+    one for each VM followed by one for each of its block volumes.
+    name identifies the backup across runs and keys size_hints; the "vm:" and
+    "block:" prefixes keep a VM named "x-block-y" apart from VM x's volume y.
+    """
+    backup_root = Path(BACKUP_DIR)
+    jobs = []
+    for vm in vm_names:
+        logger.info("Queueing exports for VM: %s", vm)
+        vm_backup_path = str(backup_root / f"{vm}-{timestamp}{BACKUP_EXT}")
+        name = f"vm:{vm}"
+        jobs.append((vm, name, export_vm, (vm, vm_backup_path, PROJECT, size_hints.get(name))))
+
+        if vm in vm_block_volumes:
+            for volume_name in vm_block_volumes[vm]:
+                name = f"block:{vm}/{volume_name}"
+                block_backup_path = str(backup_root / f"{vm}-block-{volume_name}-{timestamp}{BACKUP_EXT}")
+                jobs.append((vm, name, export_block_volume,
+                             (STORAGE_POOL, volume_name, block_backup_path, PROJECT, size_hints.get(name))))
+        else:
+            logger.debug("No block volumes found for VM %s", vm)
+    return jobs
+
+def run_export_job(job, compress_threads=_COMPRESS_THREADS):
+    """
+    Runs one export job, returning (vm, name, size, error) where error is
+    None on success and size is the backup size in bytes, if known.
+    """
+    vm, name, func, args = job
+    try:
+        return vm, name, func(*args, compress_threads=compress_threads), None
+    except Exception as e:
+        return vm, name, None, e
+
 def main():
+    # One clock reading per run keeps the file stamps and retention cutoff consistent.
+    run_start = datetime.now()
     logger.info("Starting backup process for Incus VMs.")
     
     try:
         check_backup_dir(BACKUP_DIR)
-        vm_names = get_vm_names()
-        vm_block_volumes = get_vm_block_volumes(STORAGE_POOL, PROJECT)
+        client = IncusClient(INCUS_SOCKET)
+        try:
+            vm_names = get_vm_names(PROJECT, client)
+            vm_block_volumes = get_vm_block_volumes(STORAGE_POOL, PROJECT, client)
+        finally:
+            client.close()
         
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        timestamp = run_start.strftime("%Y%m%d%H%M%S")
         
-        for vm in vm_names:
-            logger.info(f"Processing VM: {vm}")
-            try:
-                # Export VM
-                vm_backup_path = f"{BACKUP_DIR.rstrip('/')}/{vm}-{timestamp}.tar.gz"
-                export_vm(vm, vm_backup_path)
-                
-                # Export associated block volumes
-                if vm in vm_block_volumes:
-                    for volume_name in vm_block_volumes[vm]:
-                        block_backup_path = f"{BACKUP_DIR.rstrip('/')}/{vm}-block-{volume_name}-{timestamp}.tar.gz"
-                        export_block_volume(STORAGE_POOL, volume_name, block_backup_path, PROJECT)
-                else:
-                    logger.debug(f"No block volumes found for VM {vm}")
-            except Exception as e:
-                logger.error(f"Skipping {vm} due to error: {e}")
+        size_hints_path = os.path.join(BACKUP_DIR, SIZE_HINTS_FILE)
+        # Only preallocation uses the sizes, so leave the sidecar file alone when it is off.
+        size_hints = load_size_hints(size_hints_path) if PREALLOCATE_BACKUPS else {}
+
+        # Phase 1: queue every VM and block volume export up front.
+        jobs = plan_exports(vm_names, vm_block_volumes, timestamp, size_hints)
+
+        # Phase 2: fan the exports out so block volumes overlap with other VMs.
+        workers = max(1, min(MAX_PARALLEL_EXPORTS, len(jobs), os.cpu_count() or MAX_PARALLEL_EXPORTS))
+        # Share the compressor threads between the pipelines instead of giving each all cores.
+        compress_threads = max(1, _COMPRESS_THREADS // workers)
+        logger.debug("Running %d exports with %d parallel workers, %d compressor thread(s) each",
+                     len(jobs), workers, compress_threads)
+        failures = defaultdict(list)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_export_job, job, compress_threads) for job in jobs]
+            # Collect results as exports finish rather than in submission order.
+            for future in as_completed(futures):
+                vm, name, size, error = future.result()
+                if error is not None:
+                    failures[vm].append(error)
+                elif size is not None:
+                    size_hints[name] = size
+
+        for vm, errors in failures.items():
+            logger.error("Backup of %s incomplete: %d export(s) failed", vm, len(errors))
+
+        if PREALLOCATE_BACKUPS and jobs:
+            # Keep only this run's backups so deleted VMs and detached volumes drop out;
+            # a failed export keeps its previous size.
+            planned = {name for _, name, _, _ in jobs}
+            save_size_hints(size_hints_path,
+                            {name: size for name, size in size_hints.items() if name in planned})
         
-        prune_old_backups()
+        prune_old_backups(run_start - timedelta(days=BACKUP_RETENTION_DAYS))
         
     except Exception as e:
         logger.error(f"Fatal error in main process: {e}")
+    finally:
+        if file_log_handler:
+            file_log_handler.flush()
 
 if __name__ == "__main__":
     main()